@@ -2,10 +2,26 @@
 import streamlit as st
 import os
 import io
-from PIL import Image
-from gtts import gTTS
-import pyttsx3
-import tempfile
+import re
+import asyncio
+import contextlib
+import hashlib
+import threading
+import time
+import base64
+import binascii
+import urllib.request
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps, ExifTags
+import requests
+import anthropic
+
+# Optional: libvips decodes, resizes and re-encodes in a single pipeline when installed
+try:
+    import pyvips
+except (ImportError, OSError):
+    pyvips = None
 
 # =============================================================================
 # CONFIGURATION
@@ -21,6 +37,82 @@ if not ANTHROPIC_API_KEY:
     except ImportError:
         pass
 
+# Instructions shared by every request. They go in the system prompt so the cache
+# breakpoint covers a prefix that sits ahead of the per-request image
+DESCRIPTION_PROMPT = """Please provide a detailed, accessible description of this image. Focus on:
+
+1. Overall scene and setting
+2. People, objects, and their positions
+3. Colors, lighting, and visual details
+4. Any text visible in the image
+5. Spatial relationships (left, right, center, background, foreground)
+
+Write in clear, descriptive language that would be helpful for someone who cannot see the image. Be specific about locations, colors, and what's happening in the scene."""
+DESCRIPTION_SYSTEM = [{"type": "text", "text": DESCRIPTION_PROMPT, "cache_control": {"type": "ephemeral"}}]
+
+# Beta flag for referencing uploaded images by file_id instead of inlining them as base64
+FILES_API_BETA = "files-api-2025-04-14"
+
+# Number of top vision models queried concurrently; the first to start streaming wins
+HEDGED_MODEL_COUNT = 2
+
+# Sentences synthesized concurrently for one analysis while Claude keeps streaming
+TTS_WORKERS = 4
+
+# TTS threads shared by every session; each analysis holds at most TTS_WORKERS of them,
+# so one long description or album can't queue ahead of everyone else's audio
+TTS_POOL_WORKERS = 16
+
+# Albums with more images than this go through the Message Batches API (half price, not interactive)
+BATCH_THRESHOLD = 3
+
+# Message Batch polling: the wait doubles after every check, up to the cap (seconds)
+BATCH_POLL_INTERVAL = 10
+BATCH_MAX_POLL_INTERVAL = 300
+
+# Largest upload accepted from the browser
+MAX_UPLOAD_MB = 10
+
+# Limits for the image sent to Claude
+MAX_IMAGE_DIMENSION = 1920
+MAX_IMAGE_BYTES = 5 * 1024 * 1024  # 5MB
+
+# Largest JPEG sent exactly as uploaded; base64 grows inline payloads by 4/3, so this
+# keeps even inlined images under MAX_IMAGE_BYTES
+MAX_PASSTHROUGH_BYTES = MAX_IMAGE_BYTES * 3 // 4
+
+# Sentence boundaries used to hand finished text to TTS while Claude is still streaming
+SENTENCE_END = re.compile(r'[.!?]\s|\n')
+
+# A period after a list number or short abbreviation ("1.", "Dr.", "e.g.") doesn't end a sentence
+NOT_SENTENCE_END = re.compile(r'(?:\b\d+|\b[A-Z][a-z]{0,2}|\b(?:[a-z]\.)+[a-z])\.\s$')
+
+# Shorter pieces wait for the next boundary rather than becoming a clip of their own
+MIN_SENTENCE_CHARS = 20
+
+def split_sentences(text):
+    """Split streamed text into (complete sentences, unfinished remainder)"""
+    end = 0
+    for match in SENTENCE_END.finditer(text):
+        piece = text[end:match.end()]
+        if len(piece.strip()) >= MIN_SENTENCE_CHARS and not NOT_SENTENCE_END.search(piece):
+            end = match.end()
+    return text[:end], text[end:]
+
+def audio_mime_type(audio_bytes):
+    """MIME type for TTS output: WAV from the pyttsx3 fallback, otherwise MP3 from gTTS"""
+    return 'audio/wav' if audio_bytes.startswith(b'RIFF') else 'audio/mpeg'
+
+def join_audio(chunks):
+    """Join sentence clips into one file, or None unless every clip is a gTTS MP3
+
+    MP3 clips are whole frames and concatenate cleanly; WAVs from the pyttsx3 fallback keep
+    the first file's header and length, and a failed (None) clip would leave a gap.
+    """
+    if not chunks or not all(chunk and audio_mime_type(chunk) == 'audio/mpeg' for chunk in chunks):
+        return None
+    return b''.join(chunks)
+
 # =============================================================================
 # SESSION STATE INITIALIZATION
 # =============================================================================
@@ -29,8 +121,103 @@ def initialize_session_state():
     """Initialize all session state variables"""
     if 'uploaded_file' not in st.session_state:
         st.session_state.uploaded_file = None
+    if 'pil_image' not in st.session_state:
+        st.session_state.pil_image = None
+    if 'uploaded_bytes' not in st.session_state:
+        st.session_state.uploaded_bytes = None
     if 'analysis_results' not in st.session_state:
         st.session_state.analysis_results = None
+    if 'album' not in st.session_state:
+        st.session_state.album = {}
+    if 'album_results' not in st.session_state:
+        st.session_state.album_results = None
+    if 'album_batch' not in st.session_state:
+        st.session_state.album_batch = None
+
+def clear_upload():
+    """Forget the current upload and its decoded image"""
+    st.session_state.uploaded_file = None
+    st.session_state.pil_image = None
+    st.session_state.uploaded_bytes = None
+
+# =============================================================================
+# RESULT CACHE
+# =============================================================================
+
+class ResultCache:
+    """Small thread-safe LRU store shared across Streamlit reruns"""
+    
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+    
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+@st.cache_resource
+def get_description_cache():
+    """(description, model_used) keyed by the SHA-256 of the uploaded file"""
+    return ResultCache()
+
+@st.cache_resource
+def get_audio_cache():
+    """Synthesized audio keyed by the description it was generated from"""
+    return ResultCache()
+
+# =============================================================================
+# TEXT-TO-SPEECH
+# =============================================================================
+
+# Audio payload inside Google Translate's batchexecute response (same pattern gTTS uses)
+GTTS_AUDIO = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+@st.cache_resource
+def get_tts_session():
+    """Keep-alive HTTP session shared by every gTTS request"""
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=TTS_POOL_WORKERS, max_retries=Retry(total=2, backoff_factor=0.5))
+    session.mount('https://', adapter)
+    return session
+
+def stream_gtts(tts, session):
+    """Stream a gTTS clip over the shared session instead of opening a new connection per request"""
+    from gtts import gTTSError
+    
+    for prepared in tts._prepare_requests():
+        try:
+            response = session.send(
+                prepared,
+                proxies=urllib.request.getproxies(),
+                timeout=tts.timeout
+            )
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            raise gTTSError(tts=tts, response=response)
+        except requests.exceptions.RequestException:
+            raise gTTSError(tts=tts)
+        
+        for line in response.iter_lines(chunk_size=1024):
+            decoded_line = line.decode('utf-8')
+            if 'jQ1olc' in decoded_line:
+                audio_search = GTTS_AUDIO.search(decoded_line)
+                if not audio_search:
+                    raise gTTSError(tts=tts, response=response)
+                yield base64.b64decode(audio_search.group(1).encode('ascii'))
 
 # =============================================================================
 # AI ANALYSIS ENGINE
@@ -43,152 +230,546 @@ class PerceptoAI:
         if not ANTHROPIC_API_KEY:
             raise ValueError("ANTHROPIC_API_KEY is not set. Please check your .env file.")
         
+        # Raising keeps st.cache_resource from caching an engine without a client
         try:
-            import anthropic
-            self.client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-            self.vision_models = [
-                "claude-3-5-sonnet-20241022",
-                "claude-3-5-haiku-20241022", 
-                "claude-3-sonnet-20240229",
-                "claude-3-haiku-20240307"
-            ]
-            self.model = self.vision_models[0]
+            self.client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
         except Exception as e:
             print(f"Error initializing Claude client: {e}")
-            self.client = None
+            raise
+        
+        self.vision_models = [
+            "claude-3-5-sonnet-20241022",
+            "claude-3-5-haiku-20241022", 
+            "claude-3-sonnet-20240229",
+            "claude-3-haiku-20240307"
+        ]
+        self.model = self.vision_models[0]
+        self.description_cache = get_description_cache()
+        self.audio_cache = get_audio_cache()
+        self.tts_session = get_tts_session()
+        self.tts_pool = ThreadPoolExecutor(max_workers=TTS_POOL_WORKERS)
+        self.pyttsx_engine = None
+        # pyttsx3 keeps one engine per driver for the whole process, so its use is serialized process-wide
+        self.pyttsx_lock = threading.Lock()
+        
+        # The async client's connection pool is bound to one event loop, so the
+        # engine keeps its own loop alive for as long as it is cached
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="percepto-io", daemon=True).start()
     
-    def _image_to_base64(self, image):
-        """Convert PIL image to base64 with compression to stay under 5MB limit"""
-        import base64
+    def _prepare_jpeg(self, image, image_bytes):
+        """Encode the upload as JPEG, preferring libvips and falling back to PIL for formats it can't read
+
+        image may be None, in which case it is opened lazily from image_bytes.
+        """
+        if image is None:
+            image = Image.open(io.BytesIO(image_bytes))
         
-        # Convert to RGB if needed
+        # Upright JPEGs that are already small enough are sent exactly as uploaded
+        if (image_bytes.startswith(b'\xff\xd8\xff')
+                and len(image_bytes) < MAX_PASSTHROUGH_BYTES
+                and max(image.size) <= MAX_IMAGE_DIMENSION
+                and image.getexif().get(ExifTags.Base.Orientation, 1) == 1):
+            return image_bytes
+        
+        if pyvips is not None:
+            try:
+                return self._vips_to_jpeg(image_bytes)
+            except pyvips.Error as e:
+                print(f"libvips could not process image, using PIL: {e}")
+        return self._image_to_jpeg(image)
+    
+    def _image_to_jpeg(self, image):
+        """Convert PIL image to JPEG bytes under the 5MB limit"""
+        # Convert to RGB if needed, otherwise copy so the caller's image is left untouched
         if image.mode == 'RGBA':
             image = image.convert('RGB')
+        else:
+            image = image.copy()
         
-        # Resize image if too large (max dimension 1920px)
-        max_size = 1920
+        # Resize image if too large (max dimension 1920px): a cheap integer box reduce
+        # gets close to the target, then LANCZOS only runs over the much smaller image
+        max_size = MAX_IMAGE_DIMENSION
         if image.width > max_size or image.height > max_size:
-            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS, reducing_gap=1.0)
         
-        # Try different quality levels to stay under 5MB
-        max_size_bytes = 5 * 1024 * 1024  # 5MB
+        # Bake in the EXIF orientation, then drop EXIF, ICC and embedded thumbnails from the payload
+        image = ImageOps.exif_transpose(image)
+        image.info.pop('exif', None)
+        image.info.pop('icc_profile', None)
         
-        for quality in [85, 70, 50, 30]:
-            buffer = io.BytesIO()
-            image.save(buffer, format='JPEG', quality=quality, optimize=True)
-            image_bytes = buffer.getvalue()
-            
-            if len(image_bytes) < max_size_bytes:
-                return base64.b64encode(image_bytes).decode('utf-8'), 'jpeg'
-        
-        # If still too large, resize more aggressively
-        for max_dim in [1280, 960, 640]:
-            if image.width > max_dim or image.height > max_dim:
-                image.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
-                buffer = io.BytesIO()
-                image.save(buffer, format='JPEG', quality=50, optimize=True)
-                image_bytes = buffer.getvalue()
-                
-                if len(image_bytes) < max_size_bytes:
-                    return base64.b64encode(image_bytes).decode('utf-8'), 'jpeg'
+        # Single encode, retrying once at lower quality on the rare miss
+        image_bytes = self._encode_jpeg(image, 85)
+        if len(image_bytes) >= MAX_IMAGE_BYTES:
+            image_bytes = self._encode_jpeg(image, 70)
+        
+        return image_bytes
+    
+    def _vips_to_jpeg(self, image_bytes):
+        """Convert raw upload bytes to JPEG with libvips, shrinking while decoding"""
+        thumbnail = pyvips.Image.thumbnail_buffer(
+            image_bytes, MAX_IMAGE_DIMENSION, height=MAX_IMAGE_DIMENSION, size='down'
+        )
         
-        # Final fallback - very small image
-        image.thumbnail((480, 480), Image.Resampling.LANCZOS)
+        for quality in (85, 70):
+            jpeg_bytes = thumbnail.jpegsave_buffer(Q=quality, optimize_coding=True, interlace=True, strip=True)
+            if len(jpeg_bytes) < MAX_IMAGE_BYTES:
+                break
+        
+        return jpeg_bytes
+    
+    async def _image_source(self, jpeg_bytes):
+        """Upload the image once for every model call to reference, or inline it if the upload fails"""
+        try:
+            uploaded = await self.client.beta.files.upload(
+                file=("image.jpg", jpeg_bytes, "image/jpeg"),
+                betas=[FILES_API_BETA]
+            )
+            return {"type": "file", "file_id": uploaded.id}
+        except Exception as e:
+            print(f"File upload failed, sending image inline: {e}")
+            return self._inline_source(jpeg_bytes)
+    
+    def _inline_source(self, jpeg_bytes):
+        """Image source carrying the JPEG itself as base64"""
+        return {
+            "type": "base64",
+            "media_type": "image/jpeg",
+            "data": binascii.b2a_base64(jpeg_bytes, newline=False).decode('ascii')
+        }
+    
+    def _message_content(self, image_source):
+        """User turn for a description request; the instructions live in DESCRIPTION_SYSTEM"""
+        return [
+            {
+                "type": "image",
+                "source": image_source
+            },
+            {
+                "type": "text",
+                "text": "Describe this image."
+            }
+        ]
+    
+    def _encode_jpeg(self, image, quality):
+        """Encode a PIL image as progressive 4:2:0 JPEG bytes"""
         buffer = io.BytesIO()
-        image.save(buffer, format='JPEG', quality=30, optimize=True)
-        image_bytes = buffer.getvalue()
-        return base64.b64encode(image_bytes).decode('utf-8'), 'jpeg'
+        # Quality above 95 only inflates the file; subsampling=2 is 4:2:0 chroma
+        image.save(buffer, format='JPEG', quality=min(quality, 95), optimize=True, progressive=True, subsampling=2, exif=b"")
+        return buffer.getvalue()
     
-    def analyze_image(self, uploaded_file):
-        """Analyze image using Claude vision API"""
-        if not self.client:
-            return {"error": "Claude client not initialized"}
+    def stream_analysis(self, image, image_bytes):
+        """Run analyze_image on the engine's event loop, yielding its items to the calling thread"""
+        analysis = self.analyze_image(image, image_bytes)
+        
+        async def next_item():
+            return await analysis.__anext__()
         
         try:
-            # Load image
-            image = Image.open(uploaded_file)
-            image_data, image_format = self._image_to_base64(image)
-            
-            # Prepare message for Claude
-            message_content = [
-                {
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": f"image/{image_format}",
-                        "data": image_data
-                    }
-                },
-                {
-                    "type": "text",
-                    "text": """Please provide a detailed, accessible description of this image. Focus on:
-
-1. Overall scene and setting
-2. People, objects, and their positions
-3. Colors, lighting, and visual details
-4. Any text visible in the image
-5. Spatial relationships (left, right, center, background, foreground)
+            while True:
+                try:
+                    item = asyncio.run_coroutine_threadsafe(next_item(), self.loop).result()
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            asyncio.run_coroutine_threadsafe(analysis.aclose(), self.loop).result()
+    
+    async def analyze_image(self, image, image_bytes):
+        """Analyze image using Claude vision API, yielding (partial_description, audio_chunk, model_used, audio_file) as it streams
 
-Write in clear, descriptive language that would be helpful for someone who cannot see the image. Be specific about locations, colors, and what's happening in the scene."""
+        audio_file is the audio for the whole description and is only set on the final item.
+        """
+        # This analysis' share of the TTS pool
+        tts_slots = asyncio.Semaphore(TTS_WORKERS)
+        
+        # Repeat uploads of the same image skip the encode, Claude and (usually) TTS entirely
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        cached = self.description_cache.get(digest)
+        if cached:
+            description, model = cached
+            audio_file = await self._cached_audio(description, tts_slots)
+            yield description, audio_file, model, audio_file
+            return
+        
+        # Encode off the event loop so other sessions' streams keep flowing
+        jpeg_bytes = await asyncio.get_running_loop().run_in_executor(None, self._prepare_jpeg, image, image_bytes)
+        image_source = await self._image_source(jpeg_bytes)
+        message_content = self._message_content(image_source)
+        
+        try:
+            # Race the top models, falling back to the rest only if both fail
+            model, (open_stream, texts) = await self._open_fastest_stream(message_content)
+            
+            description = ""
+            clips = []
+            async for description, audio_chunk in self._stream_description(open_stream, texts, clips, tts_slots):
+                yield description, audio_chunk, model, None
+        finally:
+            if image_source["type"] == "file":
+                await self._delete_file(image_source["file_id"])
+        
+        self.description_cache.put(digest, (description, model))
+        
+        # Clips that can't be joined are voiced again as one piece rather than cached partially
+        audio_file = join_audio(clips)
+        if audio_file:
+            self.audio_cache.put(description, audio_file)
+        else:
+            audio_file = await self._cached_audio(description, tts_slots)
+        yield description, None, model, audio_file
+    
+    def submit_batch(self, uploads):
+        """Start a Message Batch for the uncached uploads (raw image bytes), returning (digests, batch_id, custom_ids)"""
+        return asyncio.run_coroutine_threadsafe(self._submit_batch(uploads), self.loop).result()
+    
+    def cancel_batch(self, batch_id):
+        """Cancel a submitted batch whose results are no longer wanted"""
+        return asyncio.run_coroutine_threadsafe(self.client.messages.batches.cancel(batch_id), self.loop).result()
+    
+    def collect_batch(self, digests, batch_id, custom_ids):
+        """Check a submitted batch once: (description, audio_file, model_used) or None per upload, or None while it runs"""
+        return asyncio.run_coroutine_threadsafe(self._collect_batch(digests, batch_id, custom_ids), self.loop).result()
+    
+    async def _submit_batch(self, uploads):
+        """Submit every uncached upload as one batch request; batch_id is None when there is nothing to submit"""
+        loop = asyncio.get_running_loop()
+        digests = [hashlib.sha256(image_bytes).hexdigest() for image_bytes in uploads]
+        
+        # Identical uploads in the album share one request; batch results have no streaming, so images go inline
+        pending = {digest: image_bytes for digest, image_bytes in zip(digests, uploads) if self.description_cache.get(digest) is None}
+        
+        # An image that can't be encoded (e.g. a truncated file) is left out and comes back as None
+        jpegs = await asyncio.gather(*(
+            loop.run_in_executor(None, self._prepare_jpeg, None, image_bytes)
+            for image_bytes in pending.values()
+        ), return_exceptions=True)
+        encoded = {}
+        for digest, jpeg_bytes in zip(pending, jpegs):
+            if isinstance(jpeg_bytes, Exception):
+                print(f"Could not encode album image, skipping it: {jpeg_bytes}")
+            else:
+                encoded[digest] = jpeg_bytes
+        if not encoded:
+            return digests, None, {}
+        
+        custom_ids = {f"img_{i}": digest for i, digest in enumerate(encoded)}
+        batch = await self.client.messages.batches.create(requests=[
+            {
+                "custom_id": custom_id,
+                "params": {
+                    "model": self.model,
+                    "max_tokens": 1000,
+                    "system": DESCRIPTION_SYSTEM,
+                    "messages": [{"role": "user", "content": self._message_content(self._inline_source(jpeg_bytes))}]
                 }
-            ]
+            }
+            for custom_id, jpeg_bytes in zip(custom_ids, encoded.values())
+        ])
+        return digests, batch.id, custom_ids
+    
+    async def _collect_batch(self, digests, batch_id, custom_ids):
+        """Read a finished batch's descriptions, then synthesize their audio"""
+        found = {digest: self.description_cache.get(digest) for digest in digests}
+        
+        if batch_id is not None:
+            batch = await self.client.messages.batches.retrieve(batch_id)
+            if batch.processing_status != "ended":
+                return None
             
-            # Try each model until one works
-            for model in self.vision_models:
-                try:
-                    response = self.client.messages.create(
-                        model=model,
-                        max_tokens=1000,
-                        messages=[{"role": "user", "content": message_content}]
-                    )
-                    
-                    description = response.content[0].text
-                    
-                    # Generate audio
-                    audio_file = self._generate_audio(description)
-                    
-                    return {
-                        'description': description,
-                        'audio_file': audio_file,
-                        'model_used': model
-                    }
-                    
-                except Exception as e:
-                    print(f"Model {model} failed: {e}")
+            async for entry in await self.client.messages.batches.results(batch_id):
+                digest = custom_ids[entry.custom_id]
+                if entry.result.type != "succeeded":
+                    print(f"Batch request {entry.custom_id} {entry.result.type}")
                     continue
+                message = entry.result.message
+                description = "".join(block.text for block in message.content if block.type == "text")
+                found[digest] = (description, message.model)
+                self.description_cache.put(digest, found[digest])
+        
+        results = [found[digest] for digest in digests]
+        tts_slots = asyncio.Semaphore(TTS_WORKERS)
+        audio_files = iter(await asyncio.gather(*(self._cached_audio(result[0], tts_slots) for result in results if result)))
+        return [(result[0], next(audio_files), result[1]) if result else None for result in results]
+    
+    async def _delete_file(self, file_id):
+        """Remove an uploaded image once no model call needs it any more"""
+        try:
+            await self.client.beta.files.delete(file_id, betas=[FILES_API_BETA])
+        except Exception as e:
+            print(f"Could not delete uploaded file {file_id}: {e}")
+    
+    async def _open_stream(self, model, message_content):
+        """Open a streaming completion and wait for its first text so failures surface early"""
+        async with contextlib.AsyncExitStack() as stack:
+            stream = await stack.enter_async_context(self.client.beta.messages.stream(
+                model=model,
+                max_tokens=1000,
+                system=DESCRIPTION_SYSTEM,
+                messages=[{"role": "user", "content": message_content}],
+                betas=[FILES_API_BETA]
+            ))
+            text_stream = stream.text_stream.__aiter__()
+            first_text = await text_stream.__anext__()
             
-            return {"error": "All models failed. Please try again later."}
+            async def texts():
+                yield first_text
+                async for text in text_stream:
+                    yield text
             
-        except Exception as e:
-            return {"error": f"Analysis failed: {str(e)}"}
+            # Keep the stream open past this block; the caller closes it when done
+            return stack.pop_all(), texts()
+    
+    async def _open_fastest_stream(self, message_content):
+        """Hedge the top models concurrently and keep whichever starts streaming first"""
+        tasks = {
+            asyncio.ensure_future(self._open_stream(model, message_content)): model
+            for model in self.vision_models[:HEDGED_MODEL_COUNT]
+        }
+        pending = set(tasks)
+        winner = None
+        
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        print(f"Model {tasks[task]} failed: {task.exception()}")
+                    elif winner is None:
+                        winner = tasks[task], task.result()
+                    else:
+                        # Both hedged calls answered at once; close the spare stream
+                        await task.result()[0].aclose()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        if winner:
+            return winner
+        
+        # Both hedged calls failed, try the remaining models one at a time
+        for model in self.vision_models[HEDGED_MODEL_COUNT:]:
+            try:
+                return model, await self._open_stream(model, message_content)
+            except Exception as e:
+                print(f"Model {model} failed: {e}")
+                continue
+        
+        raise RuntimeError("All models failed. Please try again later.")
+    
+    async def _stream_description(self, open_stream, texts, clips, tts_slots):
+        """Consume a description stream, synthesizing audio sentence by sentence
+
+        Every sentence's clip is also appended to clips in order, including failed (None) ones.
+        """
+        description = ""
+        unfinished = ""
+        pending_audio = deque()
+        
+        async with open_stream:
+            async for text in texts:
+                description += text
+                sentences, unfinished = split_sentences(unfinished + text)
+                if sentences.strip():
+                    pending_audio.append(asyncio.ensure_future(self._synthesize(sentences, tts_slots)))
+                
+                # Hand back audio that finished while the text kept streaming
+                while pending_audio and pending_audio[0].done():
+                    clips.append(pending_audio.popleft().result())
+                    yield description, clips[-1]
+                yield description, None
+        
+        if unfinished.strip():
+            pending_audio.append(asyncio.ensure_future(self._synthesize(unfinished, tts_slots)))
+        while pending_audio:
+            clips.append(await pending_audio.popleft())
+            yield description, clips[-1]
+    
+    async def _synthesize(self, text, tts_slots):
+        """Run _generate_audio on the shared TTS pool once one of the caller's slots is free"""
+        async with tts_slots:
+            return await asyncio.get_running_loop().run_in_executor(self.tts_pool, self._generate_audio, text)
+    
+    async def _cached_audio(self, description, tts_slots):
+        """Audio for a full description, synthesized only if the audio cache doesn't have it"""
+        audio_file = self.audio_cache.get(description)
+        if audio_file is None:
+            audio_file = await self._synthesize(description, tts_slots)
+            if audio_file:
+                self.audio_cache.put(description, audio_file)
+        return audio_file
     
     def _generate_audio(self, text):
         """Generate audio from text using TTS"""
         try:
             # Try gTTS first (better quality)
+            from gtts import gTTS
+            
             tts = gTTS(text=text, lang='en', slow=False)
-            audio_buffer = io.BytesIO()
-            tts.write_to_fp(audio_buffer)
-            audio_buffer.seek(0)
-            return audio_buffer.getvalue()
+            return b"".join(stream_gtts(tts, self.tts_session))
         except:
             try:
-                # Fallback to pyttsx3 (offline)
-                engine = pyttsx3.init()
-                engine.setProperty('rate', 150)
-                engine.setProperty('volume', 0.9)
+                # Fallback to pyttsx3 (offline); the engine isn't thread-safe
+                import tempfile
                 
-                with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
-                    engine.save_to_file(text, tmp_file.name)
-                    engine.runAndWait()
-                    
-                    with open(tmp_file.name, 'rb') as f:
-                        audio_data = f.read()
+                with self.pyttsx_lock:
+                    engine = self._get_pyttsx_engine()
                     
-                    os.unlink(tmp_file.name)
-                    return audio_data
+                    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
+                        engine.save_to_file(text, tmp_file.name)
+                        engine.runAndWait()
+                        
+                        with open(tmp_file.name, 'rb') as f:
+                            audio_data = f.read()
+                        
+                        os.unlink(tmp_file.name)
+                        return audio_data
             except:
                 return None
+    
+    def _get_pyttsx_engine(self):
+        """Create the offline TTS engine on first use; pyttsx3.init() loads a speech driver every call"""
+        if self.pyttsx_engine is None:
+            import pyttsx3
+            
+            engine = pyttsx3.init()
+            engine.setProperty('rate', 150)
+            engine.setProperty('volume', 0.9)
+            self.pyttsx_engine = engine
+        return self.pyttsx_engine
+
+@st.cache_resource
+def get_percepto_ai():
+    """Shared analysis engine, so its client and connection pools survive reruns"""
+    return PerceptoAI()
+
+# =============================================================================
+# HTML TEMPLATES
+# =============================================================================
+
+DARK_THEME_CSS = """
+<style>
+    .stApp {
+        background-color: #0e1117;
+        color: #ffffff;
+    }
+    .stSidebar {
+        background-color: #1a1d21;
+    }
+    .stMarkdown {
+        color: #ffffff;
+    }
+    .stRadio > label {
+        color: #ffffff !important;
+    }
+    .stFileUploader > label {
+        color: #ffffff !important;
+    }
+</style>
+"""
+
+HEADER_HTML = """
+<div style='text-align: center; padding: 20px; margin-bottom: 20px; background: linear-gradient(135deg, #1e1e1e 0%, #2d2d2d 100%); border-radius: 10px;'>
+    <h1 style='color: #64b5f6; margin: 0 0 5px 0; font-size: 2.5rem; font-weight: 600;'>👁️ Percepto</h1>
+    <p style='color: #b0bec5; margin: 0; font-size: 16px;'>AI Vision for Accessibility</p>
+</div>
+"""
+
+SIDEBAR_HTML = """
+<div style='background: #2d3748; padding: 15px; border-radius: 8px; margin-bottom: 15px;'>
+    <h4 style='color: #81c784; margin: 0 0 8px 0; text-align: center;'>🔍 Accessibility Mode</h4>
+    <p style='color: #e0e0e0; text-align: center; margin: 0; font-size: 14px;'>AI-powered descriptions with audio</p>
+</div>
+
+<div style='background: #1e2936; padding: 15px; border-radius: 8px; border-left: 3px solid #64b5f6;'>
+    <h5 style='color: #64b5f6; margin: 0 0 10px 0;'>Features:</h5>
+    <ul style='color: #b0bec5; margin: 0; padding-left: 15px; font-size: 14px; line-height: 1.4;'>
+        <li>AI image analysis</li>
+        <li>Clear descriptions</li>
+        <li>Text-to-speech</li>
+        <li>Mobile-friendly</li>
+    </ul>
+</div>
+"""
+
+UPLOAD_HEADER_HTML = """
+<div style='background: #263238; padding: 15px; border-radius: 8px; margin-bottom: 20px;'>
+    <h4 style='color: #4fc3f7; margin: 0; text-align: center;'>📤 Upload Image</h4>
+</div>
+"""
+
+RESULTS_HEADER_HTML = """
+<div style='background: #1a237e; padding: 15px; border-radius: 8px; margin-bottom: 20px;'>
+    <h4 style='color: #7986cb; margin: 0; text-align: center;'>📊 Results</h4>
+</div>
+"""
+
+DESCRIPTION_HEADER_HTML = """
+<div style='background: linear-gradient(135deg, #2e3440 0%, #434c5e 100%); padding: 25px; border-radius: 15px; margin: 20px 0; border-left: 5px solid #81c784; box-shadow: 0 4px 15px rgba(0,0,0,0.2);'>
+    <h4 style='color: #81c784; margin-bottom: 15px;'>📝 Image Description</h4>
+</div>
+"""
+
+DESCRIPTION_CARD_HTML = """
+<div style='background: #1e2936; padding: 25px; border-radius: 12px; margin: 20px 0; border: 2px solid #37474f; box-shadow: 0 4px 15px rgba(0,0,0,0.3);'>
+    <p style='color: #e8eaf6; line-height: 1.8; font-size: 16px; margin: 0;'>{description}</p>
+</div>
+"""
+
+AUDIO_HEADER_HTML = """
+<div style='background: linear-gradient(135deg, #4a148c 0%, #7b1fa2 100%); padding: 25px; border-radius: 15px; margin: 20px 0; box-shadow: 0 4px 15px rgba(0,0,0,0.2);'>
+    <h4 style='color: #ce93d8; margin-bottom: 15px;'>🔊 Audio Description</h4>
+</div>
+
+<div style='background: #1a1a2e; padding: 20px; border-radius: 12px; margin: 10px 0; border: 2px solid #7b1fa2;'>
+    <p style='color: #d1c4e9; margin: 0; text-align: center;'>🎧 Listen to the audio description below - perfect for accessibility!</p>
+</div>
+"""
+
+TIPS_HTML = """
+<div style='background: linear-gradient(135deg, #1b5e20 0%, #388e3c 100%); padding: 25px; border-radius: 15px; margin: 20px 0; box-shadow: 0 4px 15px rgba(0,0,0,0.2);'>
+    <h4 style='color: #a5d6a7; margin-bottom: 15px;'>💡 Tips</h4>
+    <ul style='color: #c8e6c9; margin: 0; padding-left: 20px; line-height: 1.8;'>
+        <li>Use headphones for better audio quality</li>
+        <li>The description is optimized for screen readers</li>
+        <li>Try different images for various types of analysis</li>
+    </ul>
+</div>
+"""
+
+PLACEHOLDER_HTML = """
+<div style='background: #2d3748; padding: 30px; border-radius: 15px; margin: 20px 0; border: 2px dashed #4a5568; text-align: center;'>
+    <p style='color: #a0aec0; font-size: 18px; margin-bottom: 20px;'>📤 Upload an image and click "🔍 Analyze Image" to see AI-powered results here.</p>
+</div>
+
+<div style='background: linear-gradient(135deg, #1a365d 0%, #2c5282 100%); padding: 25px; border-radius: 15px; margin: 20px 0; box-shadow: 0 4px 15px rgba(0,0,0,0.2);'>
+    <h4 style='color: #90cdf4; margin-bottom: 15px;'>🌟 What you'll get:</h4>
+    <ul style='color: #bee3f8; margin: 0; padding-left: 20px; line-height: 1.8;'>
+        <li><strong style='color: #63b3ed;'>Detailed Description:</strong> AI analyzes your image and provides a comprehensive description</li>
+        <li><strong style='color: #63b3ed;'>Audio Output:</strong> Text-to-speech conversion for accessibility</li>
+        <li><strong style='color: #63b3ed;'>Screen Reader Friendly:</strong> Optimized for assistive technologies</li>
+    </ul>
+</div>
+"""
+
+FOOTER_HTML = """
+<div style='text-align: center; color: #666; font-size: 12px; margin-top: 1rem; padding: 10px;'>
+    <p>Made with ❤️ by <strong>Geetanshi Goel</strong></p>
+    <div style='margin-top: 8px;'>
+        <a href="https://github.com/geetanshi0205" target="_blank" style='margin: 0 8px; text-decoration: none;'>
+            <svg width="18" height="18" viewBox="0 0 24 24" fill="currentColor" style="vertical-align: middle;">
+                <path d="M12 0c-6.626 0-12 5.373-12 12 0 5.302 3.438 9.8 8.207 11.387.599.111.793-.261.793-.577v-2.234c-3.338.726-4.033-1.416-4.033-1.416-.546-1.387-1.333-1.756-1.333-1.756-1.089-.745.083-.729.083-.729 1.205.084 1.839 1.237 1.839 1.237 1.07 1.834 2.807 1.304 3.492.997.107-.775.418-1.305.762-1.604-2.665-.305-5.467-1.334-5.467-5.931 0-1.311.469-2.381 1.236-3.221-.124-.303-.535-1.524.117-3.176 0 0 1.008-.322 3.301 1.23.957-.266 1.983-.399 3.003-.404 1.02.005 2.047.138 3.006.404 2.291-1.552 3.297-1.23 3.297-1.30.653 1.653.242 2.874.118 3.176.77.84 1.235 1.911 1.235 3.221 0 4.609-2.807 5.624-5.479 5.921.43.372.823 1.102.823 2.222v3.293c0 .319.192.694.801.576 4.765-1.589 8.199-6.086 8.199-11.386 0-6.627-5.373-12-12-12z"/>
+            </svg>
+        </a>
+        <a href="https://www.linkedin.com/in/geetanshi-goel-49ba5832b/" target="_blank" style='margin: 0 8px; text-decoration: none;'>
+            <svg width="18" height="18" viewBox="0 0 24 24" fill="currentColor" style="vertical-align: middle;">
+                <path d="M20.447 20.452h-3.554v-5.569c0-1.328-.027-3.037-1.852-3.037-1.853 0-2.136 1.445-2.136 2.939v5.667H9.351V9h3.414v1.561h.046c.477-.9 1.637-1.85 3.37-1.85 3.601 0 4.267 2.37 4.267 5.455v6.286zM5.337 7.433c-1.144 0-2.063-.926-2.063-2.065 0-1.138.92-2.063 2.063-2.063 1.14 0 2.064.925 2.064 2.063 0 1.139-.925 2.065-2.064 2.065zm1.782 13.019H3.555V9h3.564v11.452zM22.225 0H1.771C.792 0 0 .774 0 1.729v20.542C0 23.227.792 24 1.771 24h20.451C23.2 24 24 23.227 24 22.271V1.729C24 .774 23.2 0 22.222 0h.003z"/>
+            </svg>
+        </a>
+    </div>
+</div>
+"""
 
 # =============================================================================
 # UI COMPONENTS
@@ -196,47 +777,26 @@ Write in clear, descriptive language that would be helpful for someone who canno
 
 def render_header():
     """Render the main header with dark theme"""
-    st.markdown("""
-    <div style='text-align: center; padding: 20px; margin-bottom: 20px; background: linear-gradient(135deg, #1e1e1e 0%, #2d2d2d 100%); border-radius: 10px;'>
-        <h1 style='color: #64b5f6; margin: 0 0 5px 0; font-size: 2.5rem; font-weight: 600;'>👁️ Percepto</h1>
-        <p style='color: #b0bec5; margin: 0; font-size: 16px;'>AI Vision for Accessibility</p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(HEADER_HTML, unsafe_allow_html=True)
 
 def render_sidebar():
     """Render the sidebar with app information"""
-    st.markdown("""
-    <div style='background: #2d3748; padding: 15px; border-radius: 8px; margin-bottom: 15px;'>
-        <h4 style='color: #81c784; margin: 0 0 8px 0; text-align: center;'>🔍 Accessibility Mode</h4>
-        <p style='color: #e0e0e0; text-align: center; margin: 0; font-size: 14px;'>AI-powered descriptions with audio</p>
-    </div>
-    
-    <div style='background: #1e2936; padding: 15px; border-radius: 8px; border-left: 3px solid #64b5f6;'>
-        <h5 style='color: #64b5f6; margin: 0 0 10px 0;'>Features:</h5>
-        <ul style='color: #b0bec5; margin: 0; padding-left: 15px; font-size: 14px; line-height: 1.4;'>
-            <li>AI image analysis</li>
-            <li>Clear descriptions</li>
-            <li>Text-to-speech</li>
-            <li>Mobile-friendly</li>
-        </ul>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(SIDEBAR_HTML, unsafe_allow_html=True)
 
 def render_upload_section():
     """Render the image upload section"""
-    st.markdown("""
-    <div style='background: #263238; padding: 15px; border-radius: 8px; margin-bottom: 20px;'>
-        <h4 style='color: #4fc3f7; margin: 0; text-align: center;'>📤 Upload Image</h4>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(UPLOAD_HEADER_HTML, unsafe_allow_html=True)
     
     # Input method selection
     input_method = st.radio(
         "Choose input method:",
-        ["📁 Upload File", "📷 Take Photo"],
+        ["📁 Upload File", "📷 Take Photo", "🗂️ Upload Album"],
         horizontal=True
     )
     
+    if input_method == "🗂️ Upload Album":
+        return render_album_upload()
+    
     uploaded_file = None
     
     if input_method == "📁 Upload File":
@@ -251,126 +811,258 @@ def render_upload_section():
     
     if uploaded_file is not None:
         # Check file size (10MB limit)
-        file_size = uploaded_file.size if hasattr(uploaded_file, 'size') else len(uploaded_file.read())
-        uploaded_file.seek(0)  # Reset file pointer after reading
+        # UploadedFile is a BytesIO, so getbuffer() measures it without copying or moving the file pointer
+        file_size = uploaded_file.size if hasattr(uploaded_file, 'size') else uploaded_file.getbuffer().nbytes
         
-        max_size_mb = 10
+        max_size_mb = MAX_UPLOAD_MB
         max_size_bytes = max_size_mb * 1024 * 1024  # 10MB in bytes
         
         if file_size > max_size_bytes:
             st.error(f"❌ File too large! Maximum size allowed is {max_size_mb}MB. Your file is {file_size / 1024 / 1024:.1f}MB.")
             st.info("💡 Please compress your image or choose a smaller file.")
-            st.session_state.uploaded_file = None
+            clear_upload()
         else:
-            st.session_state.uploaded_file = uploaded_file
-            st.success(f"✅ Image uploaded successfully! ({file_size / 1024 / 1024:.1f}MB)")
-            st.image(uploaded_file, caption="📸 Your uploaded image", use_column_width=True)
+            # Decode once per upload; later reruns and the analysis reuse this image
+            if uploaded_file != st.session_state.uploaded_file or st.session_state.pil_image is None:
+                try:
+                    image = Image.open(uploaded_file)
+                    image.load()
+                    st.session_state.pil_image = image
+                    st.session_state.uploaded_bytes = uploaded_file.getvalue()
+                    st.session_state.uploaded_file = uploaded_file
+                except Exception as e:
+                    clear_upload()
+                    st.error(f"❌ Could not read this image: {str(e)}")
+                    st.info("💡 Please try a different image or format.")
+            
+            if st.session_state.uploaded_file:
+                st.success(f"✅ Image uploaded successfully! ({file_size / 1024 / 1024:.1f}MB)")
+                # The raw upload goes out as-is; a PIL image would be re-encoded at full size every rerun
+                st.image(st.session_state.uploaded_bytes, caption="📸 Your uploaded image", use_column_width=True)
     else:
-        st.session_state.uploaded_file = None
+        clear_upload()
     
     if st.session_state.uploaded_file:
         st.markdown("---")
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
             if st.button("🔍 **Analyze Image**", type="primary", use_container_width=True):
-                return True
-    return False
-
-def render_results_section():
-    """Render the analysis results section"""
-    st.markdown("""
-    <div style='background: #1a237e; padding: 15px; border-radius: 8px; margin-bottom: 20px;'>
-        <h4 style='color: #7986cb; margin: 0; text-align: center;'>📊 Results</h4>
-    </div>
-    """, unsafe_allow_html=True)
+                return 'image'
+    return None
+
+def render_album_upload():
+    """Render the multi-image uploader used for albums"""
+    uploaded_files = st.file_uploader(
+        "Choose image files",
+        type=['png', 'jpg', 'jpeg', 'bmp', 'webp'],
+        accept_multiple_files=True,
+        key="album_upload",
+        help=f"Limit {MAX_UPLOAD_MB}MB per file • Albums of more than {BATCH_THRESHOLD} images are described in one background batch"
+    )
     
-    if st.session_state.analysis_results:
-        results = st.session_state.analysis_results
+    # Only the raw bytes are kept; images are decoded when they are analyzed
+    album = {}
+    for uploaded_file in uploaded_files or []:
+        if uploaded_file.file_id in st.session_state.album:
+            album[uploaded_file.file_id] = st.session_state.album[uploaded_file.file_id]
+            continue
+        if uploaded_file.size > MAX_UPLOAD_MB * 1024 * 1024:
+            st.warning(f"⚠️ Skipping {uploaded_file.name}: larger than {MAX_UPLOAD_MB}MB.")
+            continue
+        try:
+            # Opening only parses the header, which is enough to reject files that aren't images
+            Image.open(uploaded_file)
+            album[uploaded_file.file_id] = (uploaded_file.name, uploaded_file.getvalue())
+        except Exception as e:
+            st.warning(f"⚠️ Skipping {uploaded_file.name}: {str(e)}")
+    st.session_state.album = album
+    
+    if album:
+        names = [name for name, _ in album.values()]
+        st.success(f"✅ {len(album)} images ready")
+        st.image([image_bytes for _, image_bytes in album.values()], caption=names, width=160)
         
-        # Show description
-        st.markdown("""
-        <div style='background: linear-gradient(135deg, #2e3440 0%, #434c5e 100%); padding: 25px; border-radius: 15px; margin: 20px 0; border-left: 5px solid #81c784; box-shadow: 0 4px 15px rgba(0,0,0,0.2);'>
-            <h4 style='color: #81c784; margin-bottom: 15px;'>📝 Image Description</h4>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown("---")
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col2:
+            if st.button("🔍 **Analyze Album**", type="primary", use_container_width=True):
+                return 'album'
+    return None
+
+def analyze_album():
+    """Describe every image in the album, as one Message Batch once it is larger than BATCH_THRESHOLD"""
+    album = list(st.session_state.album.values())
+    names = [name for name, _ in album]
+    uploads = [image_bytes for _, image_bytes in album]
+    
+    # A new album replaces any batch still running for the previous one
+    drop_album_batch()
+    
+    with st.spinner(f"🤖 Analyzing {len(album)} images with AI..."):
+        try:
+            ai = get_percepto_ai()
+            if len(uploads) > BATCH_THRESHOLD:
+                digests, batch_id, custom_ids = ai.submit_batch(uploads)
+                if batch_id is not None:
+                    # The batch is polled on later reruns, so this script never waits for it to finish
+                    st.session_state.album_batch = {
+                        'names': names,
+                        'digests': digests,
+                        'batch_id': batch_id,
+                        'custom_ids': custom_ids,
+                        'attempt': 0
+                    }
+                    st.session_state.album_results = None
+                    return
+                
+                # Nothing needed describing, so the cached results are ready now
+                results = ai.collect_batch(digests, None, {})
+            else:
+                results = []
+                for image_bytes in uploads:
+                    try:
+                        *_, (description, _, model_used, audio_file) = ai.stream_analysis(None, image_bytes)
+                        result = (description, audio_file, model_used)
+                    except Exception as e:
+                        print(f"Album image failed: {e}")
+                        result = None
+                    results.append(result)
+        except Exception as e:
+            st.error(f"❌ Analysis failed: {str(e)}")
+            st.info("💡 Please check your ANTHROPIC_API_KEY and internet connection.")
+            return
+    
+    st.session_state.album_results = list(zip(names, results))
+    st.session_state.analysis_results = None
+
+def drop_album_batch():
+    """Forget the pending album batch, cancelling it so it stops running and being billed"""
+    pending = st.session_state.album_batch
+    st.session_state.album_batch = None
+    if pending:
+        try:
+            get_percepto_ai().cancel_batch(pending['batch_id'])
+        except Exception as e:
+            print(f"Could not cancel album batch {pending['batch_id']}: {e}")
+
+def check_album_batch():
+    """Poll the pending album batch once, storing its results when it has ended"""
+    pending = st.session_state.album_batch
+    try:
+        results = get_percepto_ai().collect_batch(pending['digests'], pending['batch_id'], pending['custom_ids'])
+    except Exception as e:
+        drop_album_batch()
+        st.error(f"❌ Album analysis failed: {str(e)}")
+        return
+    
+    if results is not None:
+        st.session_state.album_batch = None
+        st.session_state.album_results = list(zip(pending['names'], results))
+        st.session_state.analysis_results = None
+
+def wait_for_album_batch():
+    """Count down to the next batch check with exponential backoff, then rerun
+
+    The wait is a rerun rather than a blocking poll, so any interaction or closing the tab ends it.
+    """
+    pending = st.session_state.album_batch
+    delay = min(BATCH_POLL_INTERVAL * 2 ** pending['attempt'], BATCH_MAX_POLL_INTERVAL)
+    pending['attempt'] += 1
+    
+    countdown = st.empty()
+    for remaining in range(delay, 0, -1):
+        countdown.caption(f"⏳ Checking the album batch again in {remaining}s")
+        time.sleep(1)
+    st.rerun()
+
+def render_live_results(analysis):
+    """Stream a running analysis into the results section, sentence audio first"""
+    with st.spinner("🤖 Analyzing your image with AI..."):
+        try:
+            description_slot = st.empty()
+            audio_area = st.container()
+            
+            description = ""
+            model_used = None
+            audio_file = None
+            shown_audio = False
+            for description, audio_chunk, model_used, audio_file in analysis:
+                description_slot.markdown(DESCRIPTION_CARD_HTML.format(description=description), unsafe_allow_html=True)
+                if audio_chunk:
+                    with audio_area:
+                        if not shown_audio:
+                            st.markdown(AUDIO_HEADER_HTML, unsafe_allow_html=True)
+                            shown_audio = True
+                        st.audio(audio_chunk, format=audio_mime_type(audio_chunk))
+            
+        except Exception as e:
+            st.error(f"❌ Analysis failed: {str(e)}")
+            st.info("💡 Please try uploading a different image or check your internet connection.")
+            return
+    
+    st.session_state.analysis_results = {
+        'description': description,
+        'audio_file': audio_file,
+        'model_used': model_used
+    }
+    st.session_state.album_results = None
+    st.success("✅ Analysis completed successfully!")
+    st.markdown(TIPS_HTML, unsafe_allow_html=True)
+
+def render_results_section(analysis=None):
+    """Render the analysis results section, streaming into it when an analysis is running"""
+    if analysis is not None:
+        st.markdown(RESULTS_HEADER_HTML + DESCRIPTION_HEADER_HTML, unsafe_allow_html=True)
+        render_live_results(analysis)
+    
+    elif st.session_state.album_batch:
+        st.markdown(RESULTS_HEADER_HTML, unsafe_allow_html=True)
+        st.info(
+            f"⏳ Describing {len(st.session_state.album_batch['names'])} images in a background batch. "
+            "This usually takes a few minutes; the results will appear here when it ends."
+        )
+    
+    elif st.session_state.album_results:
+        st.markdown(RESULTS_HEADER_HTML, unsafe_allow_html=True)
+        
+        # One description card and audio player per album image
+        for name, result in st.session_state.album_results:
+            st.caption(f"📸 {name}")
+            if result is None:
+                st.warning("⚠️ Could not describe this image. Please try it on its own.")
+                continue
+            description, audio_file, model_used = result
+            st.markdown(DESCRIPTION_CARD_HTML.format(description=description), unsafe_allow_html=True)
+            if audio_file:
+                st.audio(audio_file, format=audio_mime_type(audio_file))
         
+        st.markdown(TIPS_HTML, unsafe_allow_html=True)
+    
+    elif st.session_state.analysis_results:
+        results = st.session_state.analysis_results
+        
+        # Show description, sent together with the section headings as one element
         description = results.get('description', 'No description available')
-        st.markdown(f"""
-        <div style='background: #1e2936; padding: 25px; border-radius: 12px; margin: 20px 0; border: 2px solid #37474f; box-shadow: 0 4px 15px rgba(0,0,0,0.3);'>
-            <p style='color: #e8eaf6; line-height: 1.8; font-size: 16px; margin: 0;'>{description}</p>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(
+            RESULTS_HEADER_HTML + DESCRIPTION_HEADER_HTML + DESCRIPTION_CARD_HTML.format(description=description),
+            unsafe_allow_html=True
+        )
         
         # Show audio
         if 'audio_file' in results and results['audio_file']:
-            st.markdown("""
-            <div style='background: linear-gradient(135deg, #4a148c 0%, #7b1fa2 100%); padding: 25px; border-radius: 15px; margin: 20px 0; box-shadow: 0 4px 15px rgba(0,0,0,0.2);'>
-                <h4 style='color: #ce93d8; margin-bottom: 15px;'>🔊 Audio Description</h4>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            st.markdown("""
-            <div style='background: #1a1a2e; padding: 20px; border-radius: 12px; margin: 10px 0; border: 2px solid #7b1fa2;'>
-                <p style='color: #d1c4e9; margin: 0; text-align: center;'>🎧 Listen to the audio description below - perfect for accessibility!</p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            st.audio(results['audio_file'], format='audio/mp3')
+            st.markdown(AUDIO_HEADER_HTML, unsafe_allow_html=True)
+            st.audio(results['audio_file'], format=audio_mime_type(results['audio_file']))
         
         # Tips section
-        st.markdown("""
-        <div style='background: linear-gradient(135deg, #1b5e20 0%, #388e3c 100%); padding: 25px; border-radius: 15px; margin: 20px 0; box-shadow: 0 4px 15px rgba(0,0,0,0.2);'>
-            <h4 style='color: #a5d6a7; margin-bottom: 15px;'>💡 Tips</h4>
-            <ul style='color: #c8e6c9; margin: 0; padding-left: 20px; line-height: 1.8;'>
-                <li>Use headphones for better audio quality</li>
-                <li>The description is optimized for screen readers</li>
-                <li>Try different images for various types of analysis</li>
-            </ul>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(TIPS_HTML, unsafe_allow_html=True)
     
     else:
-        # Placeholder
-        st.markdown("""
-        <div style='background: #2d3748; padding: 30px; border-radius: 15px; margin: 20px 0; border: 2px dashed #4a5568; text-align: center;'>
-            <p style='color: #a0aec0; font-size: 18px; margin-bottom: 20px;'>📤 Upload an image and click "🔍 Analyze Image" to see AI-powered results here.</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Features preview
-        st.markdown("""
-        <div style='background: linear-gradient(135deg, #1a365d 0%, #2c5282 100%); padding: 25px; border-radius: 15px; margin: 20px 0; box-shadow: 0 4px 15px rgba(0,0,0,0.2);'>
-            <h4 style='color: #90cdf4; margin-bottom: 15px;'>🌟 What you'll get:</h4>
-            <ul style='color: #bee3f8; margin: 0; padding-left: 20px; line-height: 1.8;'>
-                <li><strong style='color: #63b3ed;'>Detailed Description:</strong> AI analyzes your image and provides a comprehensive description</li>
-                <li><strong style='color: #63b3ed;'>Audio Output:</strong> Text-to-speech conversion for accessibility</li>
-                <li><strong style='color: #63b3ed;'>Screen Reader Friendly:</strong> Optimized for assistive technologies</li>
-            </ul>
-        </div>
-        """, unsafe_allow_html=True)
+        # Placeholder and features preview
+        st.markdown(RESULTS_HEADER_HTML + PLACEHOLDER_HTML, unsafe_allow_html=True)
 
 def render_footer():
     """Render simple footer with creator information - InkLink style"""
-    st.markdown(
-        """
-        <div style='text-align: center; color: #666; font-size: 12px; margin-top: 1rem; padding: 10px;'>
-            <p>Made with ❤️ by <strong>Geetanshi Goel</strong></p>
-            <div style='margin-top: 8px;'>
-                <a href="https://github.com/geetanshi0205" target="_blank" style='margin: 0 8px; text-decoration: none;'>
-                    <svg width="18" height="18" viewBox="0 0 24 24" fill="currentColor" style="vertical-align: middle;">
-                        <path d="M12 0c-6.626 0-12 5.373-12 12 0 5.302 3.438 9.8 8.207 11.387.599.111.793-.261.793-.577v-2.234c-3.338.726-4.033-1.416-4.033-1.416-.546-1.387-1.333-1.756-1.333-1.756-1.089-.745.083-.729.083-.729 1.205.084 1.839 1.237 1.839 1.237 1.07 1.834 2.807 1.304 3.492.997.107-.775.418-1.305.762-1.604-2.665-.305-5.467-1.334-5.467-5.931 0-1.311.469-2.381 1.236-3.221-.124-.303-.535-1.524.117-3.176 0 0 1.008-.322 3.301 1.23.957-.266 1.983-.399 3.003-.404 1.02.005 2.047.138 3.006.404 2.291-1.552 3.297-1.23 3.297-1.30.653 1.653.242 2.874.118 3.176.77.84 1.235 1.911 1.235 3.221 0 4.609-2.807 5.624-5.479 5.921.43.372.823 1.102.823 2.222v3.293c0 .319.192.694.801.576 4.765-1.589 8.199-6.086 8.199-11.386 0-6.627-5.373-12-12-12z"/>
-                    </svg>
-                </a>
-                <a href="https://www.linkedin.com/in/geetanshi-goel-49ba5832b/" target="_blank" style='margin: 0 8px; text-decoration: none;'>
-                    <svg width="18" height="18" viewBox="0 0 24 24" fill="currentColor" style="vertical-align: middle;">
-                        <path d="M20.447 20.452h-3.554v-5.569c0-1.328-.027-3.037-1.852-3.037-1.853 0-2.136 1.445-2.136 2.939v5.667H9.351V9h3.414v1.561h.046c.477-.9 1.637-1.85 3.37-1.85 3.601 0 4.267 2.37 4.267 5.455v6.286zM5.337 7.433c-1.144 0-2.063-.926-2.063-2.065 0-1.138.92-2.063 2.063-2.063 1.14 0 2.064.925 2.064 2.063 0 1.139-.925 2.065-2.064 2.065zm1.782 13.019H3.555V9h3.564v11.452zM22.225 0H1.771C.792 0 0 .774 0 1.729v20.542C0 23.227.792 24 1.771 24h20.451C23.2 24 24 23.227 24 22.271V1.729C24 .774 23.2 0 22.222 0h.003z"/>
-                    </svg>
-                </a>
-            </div>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
+    st.markdown(FOOTER_HTML, unsafe_allow_html=True)
 
 # =============================================================================
 # MAIN APPLICATION
@@ -387,26 +1079,7 @@ def main():
     )
     
     # Dark theme CSS
-    st.markdown("""
-    <style>
-        .stApp {
-            background-color: #0e1117;
-            color: #ffffff;
-        }
-        .stSidebar {
-            background-color: #1a1d21;
-        }
-        .stMarkdown {
-            color: #ffffff;
-        }
-        .stRadio > label {
-            color: #ffffff !important;
-        }
-        .stFileUploader > label {
-            color: #ffffff !important;
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(DARK_THEME_CSS, unsafe_allow_html=True)
     
     # Initialize session state
     initialize_session_state()
@@ -419,31 +1092,32 @@ def main():
         render_sidebar()
     
     # Render main content
-    should_analyze = render_upload_section()
+    action = render_upload_section()
     
     # Handle analysis
-    if should_analyze:
-        with st.spinner("🤖 Analyzing your image with AI..."):
-            try:
-                ai = PerceptoAI()
-                results = ai.analyze_image(st.session_state.uploaded_file)
-                
-                if "error" in results:
-                    st.error(f"❌ Analysis failed: {results['error']}")
-                    st.info("💡 Please try uploading a different image or check your internet connection.")
-                else:
-                    st.session_state.analysis_results = results
-                    st.success("✅ Analysis completed successfully!")
-                    
-            except Exception as e:
-                st.error(f"❌ Analysis failed: {str(e)}")
-                st.info("💡 Please check your ANTHROPIC_API_KEY and internet connection.")
+    analysis = None
+    if action == 'album':
+        analyze_album()
+    elif action == 'image':
+        drop_album_batch()
+        try:
+            ai = get_percepto_ai()
+            analysis = ai.stream_analysis(st.session_state.pil_image, st.session_state.uploaded_bytes)
+        except Exception as e:
+            st.error(f"❌ Analysis failed: {str(e)}")
+            st.info("💡 Please check your ANTHROPIC_API_KEY and internet connection.")
+    elif st.session_state.album_batch:
+        check_album_batch()
     
-    # Render results
-    render_results_section()
+    # Render results, streaming the new analysis in as it arrives
+    render_results_section(analysis)
     
     # Render footer
     render_footer()
+    
+    # Keep polling a running album batch on later reruns
+    if st.session_state.album_batch:
+        wait_for_album_batch()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file